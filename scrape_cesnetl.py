@@ -6,22 +6,37 @@
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from bs4 import BeautifulSoup
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from bs4 import BeautifulSoup, SoupStrainer
 from datetime import datetime
 from time import sleep
 import os
 from dotenv import load_dotenv
 import logging
-from datetime import datetime
 from shared_scripts.text_extractor import extract_text
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaIoBaseUpload
+import io
 from shared_scripts.url_extractor import extract_urls
-from shared_scripts.scraper import get_selenium_response
 import json
+import re
+import html
+from functools import lru_cache
+import sqlite3
+from pathlib import Path
+import atexit
+import zstandard as zstd
 import sys
+import random
 from shared_scripts.salary_functions import check_salary
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+import multiprocessing
+import threading
+import httpx
 
 ##################################### Configure the logging settings #####################################
 
@@ -34,38 +49,74 @@ logger.info("Logging configured")
 
 ##################################### Defining functions for this script #####################################
 
-# I'm not turning the next three functions into a class with three methods because it doesn't work within
-# soup_compilation.find_all('a', href = True, string = Class.method)
-def contains_posting(text):
-    '''
-    Function to filter HTML <a> elements containing postings.
+# Only parse the elements that I use from the compilations and the postings (<h2> and <a>)
+STRAINER = SoupStrainer(['a', 'h2'])
+
+# Patterns to filter HTML <a> elements containing postings, 'text/plain', and 'text/html'
+# BeautifulSoup calls their search method on the text of each <a> element (and handles elements without text)
+_RE_POSTING = re.compile(r'faculty|professor|position|instructor', re.I)
+_RE_PLAIN = re.compile(r'text/plain', re.I)
+_RE_HTML = re.compile(r'text/html', re.I)
+
+# Pattern to find signs that a page needs JavaScript to show its content (e.g., "Please enable JavaScript" or an empty app root)
+_RE_JS_REQUIRED = re.compile(r'enable javascript|javascript is (?:disabled|required)|<div id="(?:root|app)">\s*</div>', re.I)
+
+# Headers of a regular browser for the HTTP requests to the URLs inside the messages (some websites block other clients)
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+
+# Pattern to get the content of the <pre> element of a plain text message
+_RE_PRE = re.compile(r'<pre[^>]*>(.*?)</pre>', re.S | re.I)
+
+# Pattern to find the password field of the login form of LISTSERV (the same element that login_cesnet fills in)
+# In the messages, the quotes are escaped (&quot;), so a message about the login form doesn't match
+_RE_LOGIN_FORM = re.compile(r'''\bid\s*=\s*["']Password["']''', re.I)
+
+def get_retry_delay(attempt):
+    """
+    Function to get the delay before retrying after a failed attempt: exponential backoff with full jitter, so that the retries
+    of the concurrent requests are spread out instead of hitting the website or the Google APIs at the same time.
+
+    Inputs:
+    - attempt: number of the failed attempt (starting at 0).
+    Output: delay in seconds.
+
+    Dependencies: random
+    """
+    return random.uniform(0, min(max_retry_delay, retry_base_delay * 2 ** attempt))
 
-    Input: text in an <a> element.
-    Outupt: boolean--True if contains posting, False otherwise.
-    '''
-    return text and ('faculty' in text.lower() or 'professor' in text.lower() or 'position' in text.lower() or 'instructor' in text.lower())
+@lru_cache(maxsize=64)
+def parse_html(source_code):
+    """
+    Function to parse the source code of a compilation or a posting (only <a> and <h2> elements, see STRAINER).
+    Cached by source code so that the same page (e.g., when the website returns the same page after a retry) isn't parsed twice.
 
-def contains_plain_text(text):
-    '''
-    Function to filter HTML <a> elements containing 'text/plain'.
+    Input: source code of a webpage.
+    Output: BeautifulSoup object (don't modify it, it's shared between calls).
 
-    Input: text in an <a> element.
-    Outupt: boolean--True if contains 'text/plain', False otherwise.
-    '''
-    return text and ('text/plain' in text.lower())
+    Dependencies: bs4.BeautifulSoup, functools.lru_cache
+    """
+    return BeautifulSoup(source_code, 'lxml', parse_only=STRAINER)
 
-def contains_html(text):
-    '''
-    Function to filter HTML <a> elements containing 'text/html'.
+@lru_cache(maxsize=64)
+def extract_text_cached(source_code):
+    """
+    Function to extract the text from the source code of a message, cached by source code (see parse_html).
 
-    Input: text in an <a> element.
-    Outupt: boolean--True if contains 'text/html', False otherwise.
-    '''
-    return text and ('text/html' in text.lower())
+    Input: source code of a message.
+    Output: text of the message.
+
+    Dependencies: shared_scripts.text_extractor.extract_text, functools.lru_cache
+    """
+    return extract_text(source_code)
 
 def login_cesnet(driver, password):
     """
     Function to log in to the CESNET-L website.
+    It waits until the password field is clickable and, after logging in, until the password field is gone.
 
     Inputs:
     - driver: the web driver.
@@ -76,13 +127,18 @@ def login_cesnet(driver, password):
     """
     # Log in to the website
     # Find password input field and insert password
-    driver.find_element("id", "Password").send_keys(password)
+    WebDriverWait(driver, wait_time).until(EC.element_to_be_clickable((By.ID, "Password"))).send_keys(password)
     logger.info("Inside login_cesnet: password inserted.")
 
     # Click log in button
     driver.find_element("name", "e").click()
     logger.info("Inside login_cesnet: clicked log in button.")
 
+    # Wait until the page after the login is loaded
+    WebDriverWait(driver, wait_time).until(EC.invisibility_of_element_located((By.ID, "Password")))
+    sleep(sleep_time)
+    logger.info("Inside login_cesnet: page after the login loaded.")
+
 def check_login_required(source_code):
     """
     Function to check if the source code indicates that a login is required.
@@ -90,65 +146,761 @@ def check_login_required(source_code):
     Input: source code of a webpage.
     Output: boolean--True if login is required, False otherwise.
 
-    Dependencies: logging
+    Dependencies: re, logging
     """
     login_text = 'Please enter your email address and your LISTSERV password and click on the "Log In" button.'
-    logger.info(f"Inside check_login_required: returning {login_text in source_code}.")
-    return login_text in source_code
+    # The login text is near the top of the login page, so only the beginning of the source code is scanned
+    # (messages can be hundreds of KB long)
+    # In case the text is further down or reworded (e.g., a new banner or a new version of LISTSERV), the password field of
+    # the login form is also searched in the whole source code
+    login_required = login_text in source_code[:16384] or _RE_LOGIN_FORM.search(source_code) is not None
+    logger.debug("Inside check_login_required: returning %s.", login_required)
+    return login_required
+
+def get_cookies(driver):
+    """
+    Function to get the cookies of the web driver (e.g., the LISTSERV session cookie after logging in).
+
+    Input: the web driver.
+    Output: dictionary with the name and the value of each cookie.
+
+    Dependencies: selenium.webdriver
+    """
+    return {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
+
+def open_cache(cache_path):
+    """
+    Function to open the local cache of scraped pages (a SQLite database), creating it if needed.
+    Entries older than cache_max_age are deleted so that the cache doesn't grow forever.
 
-def upload_file(element_id, file_suffix, content, folder_id, service, logger):
+    Input: path of the database.
+    Output: connection to the database.
+
+    Dependencies: sqlite3, datetime, logging
+    """
+    cache_path.parent.mkdir(exist_ok=True)
+    connection = sqlite3.connect(cache_path)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            fetched_at INTEGER,
+            etag TEXT,
+            last_modified TEXT,
+            source_code TEXT,
+            text TEXT,
+            salary_flag TEXT
+        )
+    """)
+    connection.execute("DELETE FROM pages WHERE fetched_at < ?", (int(datetime.now().timestamp()) - cache_max_age,))
+    connection.commit()
+    logger.info(f"Inside open_cache: opened the cache with {connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]} pages.")
+    return connection
+
+def read_cache(url):
     """
-    Function to upload a file to Google Drive.
+    Function to read the data for a URL from the local cache.
+
+    Input: URL.
+    Output: dictionary with the source code, the text, the salary flag, the validators of the response ('etag' and
+    'last_modified'), and whether it was scraped less than cache_ttl seconds ago ('fresh'); None if the URL isn't cached.
+
+    Dependencies: sqlite3, json, datetime
+    """
+    row = cache.execute(
+        "SELECT fetched_at, etag, last_modified, source_code, text, salary_flag FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+    if row is None:
+        return None
+    fetched_at, etag, last_modified, source_code, text, salary_flag = row
+    return {
+        'fresh': datetime.now().timestamp() - fetched_at < cache_ttl,
+        'etag': etag,
+        'last_modified': last_modified,
+        'source_code': source_code,
+        'text': text,
+        'salary_flag': json.loads(salary_flag)
+    }
+
+def write_cache(url, source_code, text, salary_flag, etag=None, last_modified=None):
+    """
+    Function to write the data for a URL to the local cache (replacing the previous data, if any).
+
+    Inputs:
+    - url: URL.
+    - source_code: source code of the page.
+    - text: text of the page.
+    - salary_flag: salary flag of the text.
+    - etag: ETag header of the response (if any).
+    - last_modified: Last-Modified header of the response (if any).
+    Output: None.
+
+    Dependencies: sqlite3, json, datetime
+    """
+    cache.execute(
+        "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (url, int(datetime.now().timestamp()), etag, last_modified, source_code, text, json.dumps(salary_flag))
+        )
+    cache.commit()
+
+    return None
+
+def touch_cache(url):
+    """
+    Function to mark the cached data for a URL as scraped now (e.g., when the server says that the page didn't change).
+
+    Input: URL.
+    Output: None.
+
+    Dependencies: sqlite3, datetime
+    """
+    cache.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (int(datetime.now().timestamp()), url))
+    cache.commit()
+
+    return None
+
+def create_client(driver):
+    """
+    Function to create an HTTP client that reuses the session of the web driver (cookies and user agent).
+    Call it from inside the event loop (the client gets a lock so that only one task logs in again, see fetch_page).
+
+    Input: the web driver (already logged in).
+    Output: httpx.AsyncClient (use it with "async with").
+
+    Dependencies: httpx, asyncio, selenium.webdriver
+    """
+    client = httpx.AsyncClient(
+        cookies=get_cookies(driver),
+        headers={'User-Agent': driver.execute_script('return navigator.userAgent')},
+        http2=True,
+        timeout=request_timeout,
+        follow_redirects=True
+        )
+    # Lock for logging in again and number of the session of the web driver (increased after each login)
+    client.login_lock = asyncio.Lock()
+    client.login_session = 0
+    return client
+
+async def fetch_page(client, driver, password, url):
+    """
+    Function to get the source code of a LISTSERV page with the HTTP client.
+    If the session expired, it logs in again with the web driver and copies the new cookies to the HTTP client.
+    Only one task logs in again: the tasks that were waiting for the lock just get the page again with the new cookies.
+
+    Inputs:
+    - client: the HTTP client (with the cookies of the web driver).
+    - driver: the web driver.
+    - password: the password to log in to the website.
+    - url: the URL of the page.
+    Output: tuple with the source code and the content type of the page (e.g., 'text/plain; charset=UTF-8').
+
+    Dependencies: httpx, asyncio, selenium.webdriver, logging
+    """
+    # Get the session of the web driver used for the request
+    login_session = client.login_session
+
+    # Get the page
+    response = await client.get(url)
+    response.raise_for_status()
+    source_code = response.text
+
+    # Check if login is required
+    if check_login_required(source_code):
+        async with client.login_lock:
+            # Log in again only if no other task did it since this request was sent
+            if client.login_session == login_session:
+                logger.info("Inside fetch_page: login required. Logging in with the web driver.")
+                # Log in to the website with the web driver (in a thread, so the event loop doesn't stop meanwhile)
+                await asyncio.to_thread(driver.get, url)
+                await asyncio.to_thread(login_cesnet, driver, password)
+
+                # Copy the new session cookies to the HTTP client
+                client.cookies.update(await asyncio.to_thread(get_cookies, driver))
+                client.login_session += 1
+                logger.info("Inside fetch_page: cookies of the HTTP client re-seeded from the web driver.")
+
+        # Get the page again with the new cookies
+        response = await client.get(url)
+        response.raise_for_status()
+        source_code = response.text
+
+    return source_code, response.headers.get('Content-Type', '')
+
+async def fetch_posting(client, semaphore, driver, password, posting_id, week, url):
+    """
+    Function to scrape a posting (the plain text message or, if there isn't one, the HTML message).
+
+    Inputs:
+    - client: the HTTP client (with the cookies of the web driver).
+    - semaphore: semaphore bounding the number of concurrent requests.
+    - driver: the web driver (only used to log in again if the session expires).
+    - password: the password to log in to the website.
+    - posting_id: ID for the posting.
+    - week: week of the compilation.
+    - url: URL of the posting.
+    Output: tuple with the data for the posting for the Google Sheet (list with the ID, the week, the URL, the timestamp and
+    the salary flag) and the data for Google Drive (tuple with the source code and the text of the message).
+
+    Dependencies: asyncio, bs4.BeautifulSoup, datetime, shared_scripts, logging
+    """
+    # Create list to store the data for the posting (ID, week, URL, and current timestamp)
+    data_posting = [posting_id, week, url, datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
+    logger.debug("Inside fetch_posting: data for the posting initialized. URL: %s.", url)
+
+    # If the posting was scraped recently (e.g., in a previous run on the same day), use the cached data
+    # (the archive pages are generated on request, without validators for conditional requests)
+    cached_posting = read_cache(url)
+    if cached_posting is not None and cached_posting['fresh']:
+        data_posting.append(cached_posting['salary_flag'])
+        logger.debug("Data for the posting obtained from the cache.")
+        return data_posting, (cached_posting['source_code'], cached_posting['text'])
+
+    # Retry block in case of failure
+    for attempt in range(ntries):
+        logger.debug("Second re-try block. Attempt %s. URL: %s.", attempt + 1, url)
+
+        try:
+            async with semaphore:
+                # Get the source code for the posting
+                source_code_posting, _ = await fetch_page(client, driver, password, url)
+                logger.debug("Source code for the posting obtained.")
+
+                # Parse the source code for the posting
+                soup_posting = parse_html(source_code_posting)
+                logger.debug("Source code for the posting parsed.")
+
+                # Try getting the plain text message
+                try:
+                    url_message = url_base + soup_posting.find('a', href = True, string = _RE_PLAIN)['href']
+                    logger.debug("URL for the plain text message obtained: %s.", url_message)
+                    source_code_message, content_type_message = await fetch_page(client, driver, password, url_message)
+                    is_plain_text = True
+
+                # Get the HTML message (if there's no plain text, there's HTML)
+                except Exception:
+                    logger.debug("Something went wrong with finding the plain text message. Trying with the HTML message.")
+                    url_message = url_base + soup_posting.find('a', href = True, string = _RE_HTML)['href']
+                    logger.debug("URL for the HTML message obtained: %s.", url_message)
+                    source_code_message, content_type_message = await fetch_page(client, driver, password, url_message)
+                    is_plain_text = False
+
+                logger.debug("Source code for the message obtained.")
+
+            # Extract the text from the source code of the message
+            # If LISTSERV sends the plain text message as it is (text/plain), the body is already the text (extract_text would
+            # parse it as HTML and drop anything that looks like a tag, e.g., "<name@example.com>")
+            # If it sends the plain text message inside an HTML page, the text is the content of the <pre> element (no need to
+            # parse the whole page), unless it has markup inside (e.g., links added by LISTSERV), which only extract_text removes
+            if content_type_message.lower().startswith('text/plain'):
+                text = source_code_message
+            else:
+                pre = _RE_PRE.search(source_code_message) if is_plain_text else None
+                text = html.unescape(pre.group(1)) if pre and '<' not in pre.group(1) else extract_text_cached(source_code_message)
+            logger.debug("Text for the message extracted.")
+
+            # Check if there seems to be salary info
+            salary_flag = check_salary(text)
+            logger.debug("salary_flag: %s.", salary_flag)
+
+            # Store the salary flag for the message
+            data_posting.append(salary_flag)
+            logger.debug("Second re-try block successful. Data for the posting stored.")
+
+            # Break the loop if successful
+            break
+
+        except Exception as e:
+            logger.info(f"Second re-try block. Attempt {attempt + 1} failed. Error: {e}")
+
+            if attempt < ntries - 1:  # Check if we have retries left
+                logger.debug("Second re-try block. Sleeping before retry.")
+                await asyncio.sleep(get_retry_delay(attempt))
+            else:
+                logger.info("Second re-try block. All retries exhausted.")
+
+                # Store 'FAILURE' for the salary flag, the source code and the text for the message
+                data_posting.append('FAILURE')
+                logger.info("Data for the posting stored as 'FAILURE'.")
+                return data_posting, ('FAILURE', 'FAILURE')
+
+    # Cache the data for the posting in case the script is re-run
+    # (outside the retry block: the posting was scraped, so a failure of the cache doesn't scrape it again)
+    try:
+        write_cache(url, source_code_message, text, salary_flag)
+    except Exception as e:
+        logger.info(f"Inside fetch_posting: couldn't cache the data for the posting. URL: {url}. Error: {e}")
+
+    return data_posting, (source_code_message, text)
+
+async def scrape_postings(driver, password, missing_compilations_data, first_id):
+    """
+    Function to scrape the postings of all the missing compilations concurrently, reusing the session of the web driver.
+
+    Inputs:
+    - driver: the web driver (already logged in).
+    - password: the password to log in to the website.
+    - missing_compilations_data: list with the week and the URLs for the postings of each missing compilation.
+    - first_id: ID for the first posting.
+    Output: tuple with the list with the data for the Google Sheet of each posting (see fetch_posting), in the order of the
+    compilations and of the URLs, and the dictionary with the source code and the text of each posting by ID.
+
+    Dependencies: asyncio, httpx
+    """
+    # Create list to store the data for the weekly compilations (for the Google Sheet)
+    data_compilation = []
+
+    # Create dictionary to store the source code and the text of each posting by ID (for Google Drive)
+    blobs_compilation = {}
+
+    # Bound the number of concurrent requests to the website
+    semaphore = asyncio.Semaphore(n_concurrent_requests)
+
+    # Create the HTTP client with the session of the web driver
+    async with create_client(driver) as client:
+        logger.info("Inside scrape_postings: HTTP client created with the session of the web driver.")
+
+        # Assign the IDs for the postings up front, in the order of the compilations and of the URLs
+        posting_ids = iter(range(first_id, first_id + sum(len(urls) for _, urls in missing_compilations_data)))
+
+        # Start scraping the postings of all the missing compilations
+        tasks = [
+            [asyncio.create_task(fetch_posting(client, semaphore, driver, password, next(posting_ids), week, url)) for url in urls]
+            for week, urls in missing_compilations_data
+            ]
+
+        # Iterate over the missing compilations (oldest first)
+        for tasks_compilation in tasks:
+            # Wait for the postings of the compilation (the results are in the same order as the URLs)
+            results_compilation = await asyncio.gather(*tasks_compilation)
+            data_postings = [data_posting for data_posting, _ in results_compilation]
+            logger.info(f"Inside scrape_postings: {len(data_postings)} postings of the compilation scraped ({sum(data_posting[-1] == 'FAILURE' for data_posting in data_postings)} failed).")
+
+            # Append the data for the postings to the data for the compilations
+            data_compilation.extend(data_postings)
+            blobs_compilation.update((data_posting[0], blobs_posting) for data_posting, blobs_posting in results_compilation)
+
+    return data_compilation, blobs_compilation
+
+async def scrape_compilation(client, driver, password, url):
+    """
+    Function to scrape a weekly compilation.
+
+    Inputs:
+    - client: the HTTP client (with the session of the web driver).
+    - driver: the web driver (only used to log in again if the session expires).
+    - password: the password to log in to the website.
+    - url: URL of the compilation.
+    Output: tuple with the week of the compilation (e.g., August 2024, Week 3) and the URLs for the postings.
+
+    Dependencies: bs4.BeautifulSoup, logging
+    """
+    # Get the source code for the compilation (logging in again if required)
+    source_code, _ = await fetch_page(client, driver, password, url)
+    logger.info(f"Inside scrape_compilation: source code for the compilation obtained. URL: {url}.")
+
+    # Parse the source code for the compilation
+    soup_compilation = parse_html(source_code)
+
+    # Get the week of the compilation (the second h2 element)
+    week = soup_compilation.find_all('h2', limit=2)[1].text.strip()
+    logger.info(f"Inside scrape_compilation: week of the compilation obtained: {week}.")
+
+    # Find the URLs for the postings
+    urls = [a['href'] for a in soup_compilation.find_all('a', href=True, string=_RE_POSTING) if a['href'].startswith('https')]
+    logger.info(f"Inside scrape_compilation: URLs for the postings obtained ({len(urls)}).")
+
+    return week, urls
+
+async def scrape_compilations(driver, password, urls):
+    """
+    Function to scrape weekly compilations with one HTTP client that reuses the session of the web driver.
+
+    Inputs:
+    - driver: the web driver (already logged in).
+    - password: the password to log in to the website.
+    - urls: URLs of the compilations.
+    Output: list with the week and the URLs for the postings of each compilation (see scrape_compilation), in the same order as the URLs.
+
+    Dependencies: asyncio, httpx
+    """
+    async with create_client(driver) as client:
+        return await asyncio.gather(*[scrape_compilation(client, driver, password, url) for url in urls])
+
+def requires_javascript(source_code):
+    """
+    Function to guess if a page needs JavaScript to show its content (so that it has to be scraped with Selenium).
+
+    Input: source code of the page (without running JavaScript).
+    Output: boolean--True if the page is very short or has signs that it needs JavaScript, False otherwise.
+
+    Dependencies: re
+    """
+    return len(source_code) < min_page_length or _RE_JS_REQUIRED.search(source_code) is not None
+
+async def fetch_url(client, semaphore, url):
+    """
+    Function to get the source code of a URL inside a message with the HTTP client, using the local cache.
+    If the cached page is old, it's only downloaded again if it changed (conditional request with the cached validators).
+
+    Inputs:
+    - client: the HTTP client.
+    - semaphore: semaphore bounding the number of concurrent requests.
+    - url: the URL.
+    Output: dictionary with the source code of the page ('source_code'). If the page comes from the cache, it also has the
+    text ('text') and the salary flag ('salary_flag'); otherwise, it has the validators of the response ('etag' and
+    'last_modified'). None if the request failed (e.g., the website blocks the client) or if the page seems to need
+    JavaScript (see requires_javascript). If the URL isn't a text page (e.g., a PDF, a Word document or an image) or is larger
+    than max_page_size, the dictionary has an empty source code and text and 'FAILURE' for the salary flag.
+
+    Dependencies: httpx, logging
+    """
+    # If the URL was scraped recently, use the cached data
+    cached = read_cache(url)
+    if cached is not None and cached['fresh']:
+        logger.debug("Inside fetch_url: data obtained from the cache for %s.", url)
+        return cached
+
+    # If the cached data is old, ask the server to send the page only if it changed
+    headers = {}
+    if cached is not None and cached['etag']:
+        headers['If-None-Match'] = cached['etag']
+    if cached is not None and cached['last_modified']:
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    # Data for the URLs that aren't text pages or are too large (not scraped with Selenium either, there's no text to extract)
+    skipped = {'source_code': '', 'text': '', 'salary_flag': 'FAILURE'}
+
+    try:
+        async with semaphore:
+            # Stream the response, so that the body is only downloaded if it's a text page of a reasonable size
+            async with client.stream('GET', url, headers=headers) as response:
+
+                # The page didn't change: use the cached data
+                if response.status_code == 304 and cached is not None:
+                    touch_cache(url)
+                    logger.debug("Inside fetch_url: page not modified, data obtained from the cache for %s.", url)
+                    return cached
+
+                response.raise_for_status()
+
+                # Skip the URLs that aren't text pages (e.g., PDFs, Word documents or images)
+                # (pages without a content type are kept)
+                content_type = response.headers.get('Content-Type', '').lower()
+                if content_type and not content_type.startswith(('text/', 'application/xhtml+xml')):
+                    logger.info(f"Inside fetch_url: skipped {url} (content type: {content_type}).")
+                    return skipped
+
+                # Get the body, stopping if the page is too large
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) > max_page_size:
+                        logger.info(f"Inside fetch_url: skipped {url} (larger than {max_page_size} bytes).")
+                        return skipped
+                source_code = body.decode(response.encoding or 'utf-8', errors='replace')
+
+        # If the page seems to need JavaScript, it has to be scraped with Selenium
+        if requires_javascript(source_code):
+            logger.debug("Inside fetch_url: page seems to need JavaScript: %s.", url)
+            return None
+
+        return {'source_code': source_code, 'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+    except Exception as e:
+        logger.info(f"Inside fetch_url: request failed for {url}. Error: {e}")
+        return None
+
+async def fetch_urls(urls):
+    """
+    Function to get the source code of the URLs inside the messages concurrently.
+
+    Input: list of URLs.
+    Output: list with the data for each URL (see fetch_url), in the same order as the URLs.
+
+    Dependencies: asyncio, httpx
+    """
+    # Bound the number of concurrent requests
+    semaphore = asyncio.Semaphore(n_concurrent_requests_urls)
+
+    async with httpx.AsyncClient(headers=BROWSER_HEADERS, http2=True, timeout=request_timeout, follow_redirects=True) as client:
+        return await asyncio.gather(*[fetch_url(client, semaphore, url) for url in urls])
+
+def create_driver():
+    """
+    Function to create a headless web driver (quit automatically when the script finishes).
+
+    Inputs: none
+    Output: the web driver.
+
+    Dependencies: selenium.webdriver, selenium.webdriver.chrome.options.Options, atexit
+    """
+    options = Options()
+    options.add_argument("--headless=new") # TODO: GITHUB ACTIONS UNCOMMENT
+    options.add_argument("--blink-settings=imagesEnabled=false") # Don't load images (I only need the HTML)
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.page_load_strategy = 'eager' # Return from driver.get when the DOM is ready, without waiting for subresources
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(wait_time)
+    atexit.register(driver.quit)
+    return driver
+
+def get_browser():
+    """
+    Function to get a web driver for the current thread (created the first time), so that several pages
+    that need JavaScript are rendered at the same time, each one in the browser of its thread.
+
+    Inputs: none
+    Output: the web driver of the thread.
+
+    Dependencies: threading
+    """
+    if not hasattr(thread_local, 'browser'):
+        thread_local.browser = create_driver()
+        logger.info("Inside get_browser: created web driver for the thread")
+    return thread_local.browser
+
+def get_selenium_response(driver, url):
+    """
+    Function to get the source code of a page after running its JavaScript, with the web driver of the script
+    (instead of starting a new browser for each page).
+
+    Inputs:
+    - driver: the web driver.
+    - url: URL of the page.
+    Output: source code of the page, or an empty string if something went wrong.
+
+    Dependencies: selenium.webdriver, time.sleep, logging
+    """
+    try:
+        driver.get(url)
+        # Wait until the page and its subresources are loaded, and give its JavaScript some time to render the content
+        WebDriverWait(driver, wait_time).until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+        sleep(render_time)
+        return driver.page_source
+    except Exception as e:
+        logger.info(f"Inside get_selenium_response: something went wrong with {url}. Error: {e}")
+        return ""
+
+def extract_and_flag(source_code):
+    """
+    Function to extract the text from the source code of a page and check if there seems to be salary info.
+    Defined at the top level so that it can run in another process.
+
+    Input: source code of the page.
+    Output: tuple with the text and the salary flag.
+
+    Dependencies: shared_scripts.text_extractor.extract_text, shared_scripts.salary_functions.check_salary
+    """
+    text = extract_text(source_code)
+    return text, check_salary(text)
+
+def upload_file(element_id, file_suffix, content, folder_id, service, logger, extension='txt', mimetype='text/plain'):
+    """
+    Function to upload a file to Google Drive, with a retry block for the file.
+    The retries are per file (and not for all the files) so that a failure doesn't upload the other files again.
 
     Inputs:
     - element_id: ID of the job post
     - file_suffix: suffix of the file name
-    - content: content of the file
+    - content: content of the file (text, or bytes for already encoded content)
     - folder_id: ID of the folder in Google Drive
     - service: service for Google Drive
     - logger: logger
+    - extension: extension of the file name (default 'txt')
+    - mimetype: MIME type of the file (default 'text/plain')
 
-    Outputs: None
+    Outputs: None (raises the last error if all the retries are exhausted)
 
-    Dependencies: from googleapiclient.http import MediaFileUpload, os
+    Dependencies: from googleapiclient.http import MediaIoBaseUpload, io, time.sleep
     """
     
-    logger.info(f"Inside upload_file: uploading ID {element_id} to Google Drive.")
+    logger.debug("Inside upload_file: uploading ID %s to Google Drive.", element_id)
+
+    # Prepare the file name
+    file_name = f"{element_id}_{file_suffix}.{extension}"
+    logger.debug("Inside upload_file: prepared the name of the file for the %s", file_suffix)
+
+    # Prepare the file metadata
+    file_metadata = {
+        'name': file_name,
+        'parents': [folder_id]
+    }
+    logger.debug("Inside upload_file: prepared the file metadata for the %s", file_suffix)
+
+    # Prepare the file media (from memory, without writing a temporary file)
+    # Single request upload for most files (a resumable upload would only add round trips), and resumable upload in
+    # large chunks for the large ones (so that a failure doesn't send the whole file again)
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    media = MediaIoBaseUpload(io.BytesIO(content), mimetype=mimetype, chunksize=upload_chunk_size, resumable=len(content) > max_single_upload_size)
+    logger.debug("Inside upload_file: prepared the file media for the %s", file_suffix)
+
+    # Retry block in case of failure
+    for attempt in range(ntries):
+
+        try:
+            # Upload the file to the Drive folder
+            # Not batching the uploads: the Drive API doesn't support media uploads in batch requests
+            service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+            logger.debug("Inside upload_file: uploaded the file to the shared folder for the %s", file_suffix)
 
-    try:
-        # Prepare the file name
-        file_name = f"{element_id}_{file_suffix}.txt"
-        logger.info(f"Inside upload_file: prepared the name of the file for the {file_suffix}")
-
-        # Write the content to a temporary file
-        with open(file_name, 'w') as temp_file:
-            temp_file.write(content)
-        logger.info(f"Inside upload_file: wrote the {file_suffix} string to a temporary file")
-
-        # Prepare the file metadata
-        file_metadata = {
-            'name': file_name,
-            'parents': [folder_id]
-        }
-        logger.info(f"Inside upload_file: prepared the file metadata for the {file_suffix}")
-
-        # Prepare the file media
-        media = MediaFileUpload(file_name, mimetype='text/plain')
-        logger.info(f"Inside upload_file: prepared the file media for the {file_suffix}")
-
-        # Upload the file to the Drive folder
-        service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        logger.info(f"Inside upload_file: uploaded the file to the shared folder for the {file_suffix}")
-
-        # Remove the temporary file after uploading
-        os.remove(file_name)
-        logger.info(f"Inside upload_file: removed the temporary file after uploading for the {file_suffix}")
-    
-    except Exception as e:
-        logger.info(f"Inside upload_file: something went wrong. Error: {e}")
+            # Break the loop if successful
+            break
+
+        except Exception as e:
+            logger.info(f"Inside upload_file: attempt {attempt + 1} failed for the {file_suffix} of ID {element_id}. Error: {e}")
+
+            if attempt < ntries - 1:
+                logger.debug("Inside upload_file: sleeping before retry.")
+                sleep(get_retry_delay(attempt))
+            else:
+                # Raise, so that the job fails before the postings are appended to Google Sheets (the next run uploads them again)
+                # The other uploads still run, since each one is a separate future
+                logger.info(f"Inside upload_file: all retries exhausted. The {file_suffix} of ID {element_id} wasn't uploaded.")
+                raise
+
+    return None
+
+def get_service(service_name, version, credentials):
+    """
+    Function to get a service for a Google API for the current thread (created the first time).
+    Each thread needs its own service because the HTTP object of a service can't be shared between threads, and
+    reusing it keeps the connection to the API open for all the requests of the thread.
+
+    Inputs:
+    - service_name: name of the API (e.g., 'sheets')
+    - version: version of the API (e.g., 'v4')
+    - credentials: credentials of the service account
+
+    Output: service for the API
+
+    Dependencies: from googleapiclient.discovery import build, threading
+    """
+    services = thread_local.__dict__.setdefault('services', {})
+    if (service_name, version) not in services:
+        # Note: the responses are already gzip-compressed (the model of the client asks for gzip in every request)
+        services[(service_name, version)] = build(service_name, version, credentials=credentials)
+        logger.info(f"Inside get_service: created service for {service_name} {version} for the thread")
+    return services[(service_name, version)]
+
+def upload_element(element_id, source_code, text, folder_id, credentials):
+    """
+    Function to upload the source code and the text of an element (posting or URL inside a message) to Google Drive,
+    with the service for Google Drive of the current thread.
+    The source code is compressed with zstd (HTML compresses around 10 times), the text is small and stays as it is.
+
+    Inputs:
+    - element_id: ID of the element (used for the file names)
+    - source_code: source code of the element
+    - text: text of the element
+    - folder_id: ID of the folder in Google Drive
+    - credentials: credentials of the service account
+
+    Outputs: None
+
+    Dependencies: googleapiclient, zstandard, logging
+    """
+    service = get_service('drive', 'v3', credentials)
+    # Compress the source code (with the compressor of the thread, since a compressor can't be shared between threads)
+    if not hasattr(thread_local, 'compressor'):
+        thread_local.compressor = zstd.ZstdCompressor(level=3)
+    source_code_compressed = thread_local.compressor.compress(source_code.encode('utf-8'))
+    # Upload the source code to Google Drive
+    upload_file(element_id, "source_code", source_code_compressed, folder_id, service, logger, extension='html.zst', mimetype='application/zstd')
+    # Upload the text to Google Drive
+    upload_file(element_id, "text", text, folder_id, service, logger)
+
+    return None
+
+def append_rows(spreadsheet_id, range_sheet, rows, credentials):
+    """
+    Function to append rows after the last row with data of a Google Sheet, with a retry block.
+
+    Inputs:
+    - spreadsheet_id: ID of the Google Sheet
+    - range_sheet: range with the columns to write (e.g., 'A:E')
+    - rows: list with the values of each row
+    - credentials: credentials of the service account
+
+    Outputs: None
+
+    Dependencies: googleapiclient, time.sleep, logging
+    """
+    # Get the service for Google Sheets of the thread
+    service = get_service('sheets', 'v4', credentials)
+
+    # Retry block in case of failure
+    for attempt in range(ntries):
+
+        try:
+            logger.info(f"Inside append_rows: appending {len(rows)} rows to Google Sheets. Attempt {attempt + 1}.")
+
+            # Execute the request
+            service.spreadsheets().values().append(
+                spreadsheetId=spreadsheet_id,
+                range=range_sheet,
+                valueInputOption="USER_ENTERED",
+                insertDataOption="INSERT_ROWS",
+                body={"values": rows}
+                ).execute()
+            logger.info("Inside append_rows: appended the rows to Google Sheets.")
+
+            # Break the loop if successful
+            break
+
+        except Exception as e:
+            logger.info(f"Inside append_rows: attempt {attempt + 1} failed. Error: {e}")
+
+            if attempt < ntries - 1:
+                logger.debug("Inside append_rows: sleeping before retry.")
+                sleep(get_retry_delay(attempt))
+            else:
+                logger.info("Inside append_rows: all retries exhausted.")
+                raise
+
+    return None
+
+def append_rows_after(previous_future, spreadsheet_id, range_sheet, rows, credentials):
+    """
+    Function to append rows to a Google Sheet only if the previous chunk of rows was appended (see append_rows).
+    If a chunk fails, the next ones aren't appended either, so that there are no gaps in the IDs of the rows
+    (the IDs of the next run are based on the number of rows in the Google Sheet).
+
+    Inputs:
+    - previous_future: future for the previous chunk of rows (None for the first chunk)
+    - spreadsheet_id, range_sheet, rows, credentials: see append_rows
+
+    Outputs: None (raises the exception of the previous chunk if it failed)
+
+    Dependencies: append_rows
+    """
+    if previous_future is not None:
+        previous_future.result()
+    append_rows(spreadsheet_id, range_sheet, rows, credentials)
 
     return None
 
+def get_sheet_values(spreadsheet_id, range_sheet, credentials):
+    """
+    Function to get the values from a range of a Google Sheet (with the service for Google Sheets of the thread).
+
+    Inputs:
+    - spreadsheet_id: ID of the Google Sheet
+    - range_sheet: range to get the values from (e.g., 'A:A')
+    - credentials: credentials of the service account
+
+    Output: list with the values of each row (e.g., [['test1'], ['abc'], ['123']])
+
+    Dependencies: googleapiclient
+    """
+    service = get_service('sheets', 'v4', credentials)
+    # Retry the request (it's idempotent) with the exponential backoff of the client
+    result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=range_sheet).execute(num_retries=n_client_retries)
+    return result.get("values", [])
+
+# Storage for the services for the Google APIs, the browser and the zstd compressor of each thread
+thread_local = threading.local()
+
 logger.info('Functions defined.')
 
 ##################################### Setting parameters #####################################
@@ -159,14 +911,69 @@ username = os.getenv('USERNAME')
 password = os.getenv('PASSWORD')
 logger.info("Username and password obtained.")
 
-# Set sleep time (this is a lot, but the website is slow sometimes)
-sleep_time = 15
+# Set maximum time (in seconds) to wait for an element of a page (this is a lot, but the website is slow sometimes)
+wait_time = 30
+
+# Set sleep time as a safety margin after waiting for an element of a page
+sleep_time = 1
+
+# Set time (in seconds) for the JavaScript of a page to render its content when scraping it with Selenium
+render_time = 5
 
 # Set number of tries
 ntries = 15
 
-# Set a delay between retries
-retry_delay = 15
+# Set base delay and maximum delay (in seconds) between retries (exponential backoff with jitter, see get_retry_delay)
+retry_base_delay = 1
+max_retry_delay = 60
+
+# Set number of retries by the Google API client for the requests without a retry block
+n_client_retries = 5
+
+# Set maximum number of concurrent requests when scraping the postings
+n_concurrent_requests = 8
+
+# Set maximum number of concurrent requests when scraping the URLs inside the messages (different websites)
+n_concurrent_requests_urls = 32
+
+# Set minimum length of the source code of a page obtained without JavaScript (shorter pages are scraped with Selenium)
+min_page_length = 2000
+
+# Set maximum size (in bytes) of a page inside the messages (larger pages are skipped, e.g., a large file served as HTML)
+max_page_size = 5 * 1024 * 1024
+
+# Set number of URLs inside the messages between progress logs (the details for each URL are logged at the DEBUG level)
+n_log_progress = 100
+
+# Set number of rows for the URLs inside the messages to append to Google Sheets at once while scraping
+n_rows_chunk = 50
+
+# Set number of browsers to scrape at the same time the URLs inside the messages that need JavaScript
+n_browsers = 4
+
+# Set number of threads to upload files to Google Drive
+n_upload_workers = 16
+
+# Set maximum number of uploads of the URLs inside the messages waiting in the queue (each one holds the source code of a page)
+n_upload_queue = 2 * n_upload_workers
+
+# Set maximum size (in bytes) of a file uploaded to Google Drive in a single request (larger files use a resumable upload)
+max_single_upload_size = 5 * 1024 * 1024
+
+# Set size (in bytes) of the chunks of the resumable uploads to Google Drive
+upload_chunk_size = 8 * 1024 * 1024
+
+# Set timeout (in seconds) for the HTTP requests
+request_timeout = 30
+
+# Define directory for the local cache of the scraped pages (persisted between runs in GitHub Actions)
+cache_dir = Path('.cache')
+
+# Set time (in seconds) after which the cached pages are scraped again (with a conditional request when possible)
+cache_ttl = 24 * 60 * 60
+
+# Set time (in seconds) after which the cached pages are deleted
+cache_max_age = 30 * 24 * 60 * 60
 
 # Define URL base
 url_base = 'https://listserv.kent.edu'
@@ -176,6 +983,9 @@ url_login = "https://listserv.kent.edu/cgi-bin/wa.exe?LOGON"
 
 logger.info('All parameters set.')
 
+# Open the local cache of the scraped pages (postings and URLs inside the messages)
+cache = open_cache(cache_dir / 'scrape_cache.db')
+
 ##################################### SETTING UP GOOGLE APIS AND GET THE COMPILATIONS THAT I ALREADY SCRAPED #####################################
 
 # LOCAL MACHINE -- Set the environment variable for the service account credentials 
@@ -191,16 +1001,23 @@ logger.info('All parameters set.')
 credentials = service_account.Credentials.from_service_account_info(json.loads(os.getenv('GOOGLE_APPLICATION_CREDENTIALS')))
 logger.info("Authenticated with Google Sheets")
 
-# Create service
-service = build("sheets", "v4", credentials=credentials)
-logger.info("Created service for Google Sheets")
+# The services for Google Sheets and Google Drive are created (once per thread) when needed (see get_service)
 
-# Get the values from the Google Sheet with the postings
+# Google Sheet with the postings
 # https://docs.google.com/spreadsheets/d/1APvXQ2H1MWvpk3T7mHTyr4rkDEIOgZYZplK3a2XNspI/edit?gid=0#gid=0
 spreadsheet_postings_id = "1APvXQ2H1MWvpk3T7mHTyr4rkDEIOgZYZplK3a2XNspI"
-result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_postings_id, range='B:B').execute()
-rows = result.get("values", []) # Example output: [['test1'], ['abc'], ['123']]
-logger.info("Got data from Google Sheets with the postings")
+
+# Google Sheet with the URLs inside the messages
+# https://docs.google.com/spreadsheets/d/1Ao34BRLA9bFZ-I-koC4Qd1kGSP65X4akcOF3SPhuT18/edit?gid=0#gid=0
+spreadsheet_urls_id = "1Ao34BRLA9bFZ-I-koC4Qd1kGSP65X4akcOF3SPhuT18"
+
+# Get the values from both Google Sheets at the same time (they are different spreadsheets, so no batchGet)
+with ThreadPoolExecutor(max_workers=2) as executor:
+    future_postings = executor.submit(get_sheet_values, spreadsheet_postings_id, 'B:B', credentials)
+    future_urls = executor.submit(get_sheet_values, spreadsheet_urls_id, 'A:A', credentials)
+    rows = future_postings.result() # Example output: [['test1'], ['abc'], ['123']]
+    rows_urls = future_urls.result()
+logger.info("Got data from Google Sheets with the postings and with the URLs inside the messages")
 
 # Get list of weeks
 weeks = list(dict.fromkeys([row[0] for row in rows]))
@@ -218,23 +1035,14 @@ logger.info(f"Previous to last compilation collected obtained (previous_to_last_
 n_compilations = len(rows)
 logger.info(f"Number of existing compilations obtained: {n_compilations}.")
 
-# Get the values from the Google Sheet with the URLs inside the messages
-# https://docs.google.com/spreadsheets/d/1Ao34BRLA9bFZ-I-koC4Qd1kGSP65X4akcOF3SPhuT18/edit?gid=0#gid=0
-spreadsheet_urls_id = "1Ao34BRLA9bFZ-I-koC4Qd1kGSP65X4akcOF3SPhuT18"
-result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_urls_id, range='A:A').execute()
-rows = result.get("values", []) # Example output: [['test1'], ['abc'], ['123']]
-logger.info("Got data from Google Sheets with the URLs inside the messages")
-
 # Get the number of existing URLs inside the messages
-n_urls = len(rows)
+n_urls = len(rows_urls)
 logger.info(f"Number of existing URLs inside the messages obtained: {n_urls}.")
 
 ##################################### Scrape the compilation #####################################
 
-# Initialize the web driver
-options = Options()
-options.add_argument("--headless") # TODO: GITHUB ACTIONS UNCOMMENT
-driver = webdriver.Chrome(options=options)
+# Initialize the web driver (the same one is used for the whole script, and it's quit when the script finishes)
+driver = create_driver()
 logger.info("Web driver initialized.")
 
 # Retry block in case of failure
@@ -246,6 +1054,7 @@ for attempt in range(ntries):
         # Go to the login URL
         driver.get(url_login)
         logger.info(f"Web driver went to the login URL: {url_login}.")
+        WebDriverWait(driver, wait_time).until(EC.element_to_be_clickable((By.ID, "Password")))
         sleep(sleep_time)
 
         # Log in to the website
@@ -261,20 +1070,24 @@ for attempt in range(ntries):
         # Click log in button
         driver.find_element("name", "e").click()
         logger.info("Inside login_cesnet: clicked log in button.")
+        WebDriverWait(driver, wait_time).until(EC.presence_of_element_located((By.LINK_TEXT, "CESNET-L")))
         sleep(sleep_time)
 
         # Find the CESNET-L listserv and click on it to get to the archive
         cesnet_archive_element = driver.find_element(By.LINK_TEXT, "CESNET-L")
         cesnet_archive_element.click()
         logger.info("CESNET-L listserv found and clicked.")
+        WebDriverWait(driver, wait_time).until(EC.presence_of_element_located((By.CSS_SELECTOR, "li a")))
         sleep(sleep_time)
 
-        # Find all <li> elements
-        li_elements = driver.find_elements(By.CSS_SELECTOR, "li")
-        logger.info("All <li> elements found.")
+        # Get the text and the URL of the link of all <li> elements in one call to the web driver
+        li_elements = driver.execute_script(
+            "return Array.from(document.querySelectorAll('li')).map(l => {const a = l.querySelector('a'); return [l.innerText, a ? a.href : null];})"
+            )
+        logger.info("Text and URL of all <li> elements obtained.")
 
         # Get the text of each compilation
-        li_elements_text = [li.text for li in li_elements]
+        li_elements_text = [li[0].strip() for li in li_elements]
         logger.info("Text of each compilation obtained.")
 
         # Get the previous to latest compilation
@@ -294,116 +1107,35 @@ for attempt in range(ntries):
             logger.info("Missing at least one compilation. Continuing with the script.")
 
             # Get URL for the previous to latest compilation
-            previous_to_latest_compilation_url = li_elements[1].find_element(By.TAG_NAME, "a").get_attribute("href")
+            previous_to_latest_compilation_url = li_elements[1][1]
             logger.info(f'URL of previous to latest compilation obtained: {previous_to_latest_compilation_url}.')
 
             # Get URL for the previous to previous to latest compilation
-            previous_to_previous_to_latest_compilation_url = li_elements[2].find_element(By.TAG_NAME, "a").get_attribute("href")
+            previous_to_previous_to_latest_compilation_url = li_elements[2][1]
             logger.info(f'URL of previous to previous to latest compilation obtained: {previous_to_previous_to_latest_compilation_url}.')
 
-            # Define list to store info about the compilation(s) that I'm missing
-            missing_compilations_data = []
-            logger.info("List to store info about the compilation(s) that I'm missing initialized.")
+            # Define list to store the URLs of the compilation(s) that I'm missing (oldest first)
+            missing_compilations_urls = []
+            logger.info("List to store the URLs of the compilation(s) that I'm missing initialized.")
 
             # If I'm missing the previous to previous to latest compilation
             if previous_to_previous_to_latest_compilation != last_compilation_collected:
                 logger.info(f"{previous_to_previous_to_latest_compilation} (previous_to_previous_to_latest_compilation) != {last_compilation_collected} (last_compilation_collected).")
-
-                # Create list to store the data for the weekly compilation
-                missing_compilation = []
-
-                # Go to the previous to previous to latest compilation
-                driver.get(previous_to_previous_to_latest_compilation_url)
-                sleep(sleep_time)
-                logger.info(f"Web driver went to the previous to previous to latest compilation.")
-
-                # Check if login is required
-                if check_login_required(driver.page_source):
-                    logger.info("Login required. Logging in.")
-                    # Log in to the website
-                    login_cesnet(driver, password)
-                    sleep(sleep_time)
-
-                # Get the source code for the compilation
-                source_code = driver.page_source
-                logger.info("Source code for the compilation obtained.")
-
-                # Parse the source code for the compilation
-                soup_compilation = BeautifulSoup(source_code, 'html.parser')
-                logger.info("Source code for the compilation parsed.")
-
-                # Get the week of the compilation (the second h2 element)
-                week = soup_compilation.find_all('h2')[1].text.strip()
-                logger.info(f"Week of the compilation obtained: {week}.")
-
-                # Append the week of the compilation to the list
-                missing_compilation.append(week)
-                logger.info("Week of the compilation appended to the list.")
-
-                # Find the URLs for the postings
-                urls = [a['href'] for a in soup_compilation.find_all('a', href=True, string=contains_posting) if 'https' in a['href']]
-                logger.info("URLs for the postings obtained.")
-
-                # Append the URLs for the postings to the list
-                missing_compilation.append(urls)
-                logger.info("URLs for the postings appended to the list.")
-
-                # Append the data for the weekly compilation to the list
-                missing_compilations_data.append(missing_compilation)
-                logger.info("Data for the weekly compilation appended to the list.")
+                missing_compilations_urls.append(previous_to_previous_to_latest_compilation_url)
             else:
                 logger.info("I'm not missing the previous to previous to latest compilation.")
 
-            # There's a fair amount of repetition here, but it's only twice, so that's ok
             # If I'm missing the previous to latest compilation
             if previous_to_latest_compilation != last_compilation_collected:
                 logger.info(f"{previous_to_latest_compilation} (previous_to_latest_compilation) != {last_compilation_collected} (last_compilation_collected).")
-
-                # Create list to store the data for the weekly compilation
-                missing_compilation = []
-
-                # Go to the previous to latest compilation
-                driver.get(previous_to_latest_compilation_url)
-                sleep(sleep_time)
-                logger.info(f"Web driver went to the previous to latest compilation.")
-
-                # Check if login is required
-                if check_login_required(driver.page_source):
-                    logger.info("Login required. Logging in.")
-                    # Log in to the website
-                    login_cesnet(driver, password)
-                    sleep(sleep_time)
-
-                # Get the source code for the compilation
-                source_code = driver.page_source
-                logger.info("Source code for the compilation obtained.")
-
-                # Parse the source code for the compilation
-                soup_compilation = BeautifulSoup(source_code, 'html.parser')
-                logger.info("Source code for the compilation parsed.")
-
-                # Get the week of the compilation (the second h2 element)
-                week = soup_compilation.find_all('h2')[1].text.strip()  # e.g., August 2024, Week 3
-                logger.info(f"Week of the compilation obtained: {week}.")
-
-                # Append the week of the compilation to the list
-                missing_compilation.append(week)
-                logger.info("Week of the compilation appended to the list.")
-
-                # Find the URLs for the postings
-                urls = [a['href'] for a in soup_compilation.find_all('a', href=True, string=contains_posting) if 'https' in a['href']]
-                logger.info("URLs for the postings obtained.")
-
-                # Append the URLs for the postings to the list
-                missing_compilation.append(urls)
-                logger.info("URLs for the postings appended to the list.")
-
-                # Append the data for the weekly compilation to the list
-                missing_compilations_data.append(missing_compilation)
-                logger.info("Data for the weekly compilation appended to the list.")
+                missing_compilations_urls.append(previous_to_latest_compilation_url)
             else:
                 logger.info("I'm not missing the previous to latest compilation.")
 
+            # Scrape the compilation(s) that I'm missing: week and URLs for the postings of each one
+            missing_compilations_data = asyncio.run(scrape_compilations(driver, password, missing_compilations_urls))
+            logger.info("Data for the compilation(s) that I'm missing obtained.")
+
             # Break the loop if successful
             logger.info("First re-try block successful. About to break the loop.")
             break
@@ -413,443 +1145,258 @@ for attempt in range(ntries):
 
         if attempt < ntries - 1:  # Check if we have retries left
             logger.info("First re-try block. Sleeping before retry.")
-            sleep(retry_delay)
+            sleep(get_retry_delay(attempt))
         else:
             logger.info("First re-try block. All retries exhausted.")
             raise  # Re-raise the last exception if all retries are exhausted
 
 ##################################### Scrape the messages within the compilation #####################################
 
-# Create list to store the data for the weekly compilations
-data_compilation = []
-
 # Iterate over the missing compilations
 for missing_compilation in missing_compilations_data:
-    logger.info("Starting loop for the missing compilations.")
-
-    # Define variable with the week of the compilation
-    week = missing_compilation[0]
-    logger.info(f"Week of the compilation: {week}.")
+    logger.info(f"Missing compilation: {missing_compilation[0]}. Number of URLs for the postings: {len(missing_compilation[1])}.")
 
-    # Define variable with the URLs for the postings
-    urls = missing_compilation[1]
-    logger.info(f"URLs for the postings obtained. First URL: {urls[0]}.")
+# Create the processes to extract the text and check the salary info of the URLs inside the messages (see below), so that
+# this runs while the next pages are scraped with Selenium (forked, so that the processes don't run this script again)
+# The processes are forked before the postings are scraped, so that they don't keep a copy of the source code of the postings
+extraction_executor = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('fork'))
 
-    # Iterate over the URLs for the postings
-    for url in urls:
-        logger.info(f"Starting loop for the URLs for the postings. URL: {url}.")
+# Start all the processes now, before the threads of the browsers and of the uploads exist (forking a process with several
+# threads running can deadlock the forked processes), with a short task for each process so that none of them is reused
+for future in [extraction_executor.submit(sleep, 0.1) for _ in range(os.cpu_count())]:
+    future.result()
+logger.info("Processes for the text extraction started.")
 
-        # Create list to store the data for the posting
-        data_posting = []
+# Scrape the postings of all the missing compilations concurrently with one HTTP client
+# The results are in the order of the compilations and of the URLs
+data_compilation, blobs_compilation = asyncio.run(scrape_postings(driver, password, missing_compilations_data, n_compilations + 1))
+logger.info("Postings of the missing compilations scraped.")
 
-        # Store the ID for the posting
-        data_posting.append(n_compilations + len(data_compilation) + 1)
+# Clear the caches of parsed pages and extracted texts now that the compilations are complete (to bound memory)
+parse_html.cache_clear()
+extract_text_cached.cache_clear()
+logger.info("Caches of parsed pages and extracted texts cleared.")
 
-        # Store the week of the compilation
-        data_posting.append(week)
+##################################### Upload the messages to Google Drive #####################################
 
-        # Store the URL for the posting
-        data_posting.append(url)
-
-        # Store the current timestamp
-        data_posting.append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-        logger.info("Data for the posting initialized.")
-
-        # Retry block in case of failure
-        for attempt in range(ntries):
-            logger.info(f"Second re-try block. Attempt {attempt + 1}.")
-
-            try:
-                # Go to the URL of the posting
-                driver.get(url)
-                logger.info("Web driver went to the URL of the posting.")
-                sleep(sleep_time)
-
-                # Check if login is required
-                if check_login_required(driver.page_source):
-                    logger.info("Login required. Logging in.")
-                    # Log in to the website
-                    login_cesnet(driver, password)
-                    sleep(sleep_time)
-
-                # Get the source code for the posting
-                source_code_posting = driver.page_source
-                logger.info("Source code for the posting obtained.")
-
-                # Parse the source code for the posting
-                soup_posting = BeautifulSoup(source_code_posting, 'html.parser')
-                logger.info("Source code for the posting parsed.")
-
-                # Try getting the plain text data
-                try:
-                    logger.info("Trying to find the plain text message.")
-
-                    # Find the URL of the plain text message
-                    url_message = url_base + soup_posting.find('a', href = True, string = contains_plain_text)['href']
-                    logger.info(f"URL for the plain text message obtained: {url_message}.")
-
-                    # Go to the message URL
-                    driver.get(url_message)
-                    logger.info("Web driver went to the message URL.")
-                    sleep(sleep_time)
-
-                    # Check if login is required
-                    if check_login_required(driver.page_source):
-                        logger.info("Login required. Logging in.")
-                        # Log in to the website
-                        login_cesnet(driver, password)
-                        sleep(sleep_time)
-
-                    # Get the source code for the message
-                    source_code_message = driver.page_source
-                    logger.info("Source code for the message obtained.")
-
-                    # Extract the text from the source code of the message
-                    text = extract_text(source_code_message)
-                    logger.info("Text for the message extracted.")
-
-                    # Check if there seems to be salary info
-                    salary_flag = check_salary(text)
-                    logger.info(f"salary_flag: {salary_flag}.")
-        
-                    # Store salary flag
-                    data_posting.append(salary_flag)
-                    logger.info("Salary flag appended to the list.")
-
-                    # Store the source code for the message
-                    data_posting.append(source_code_message)
-                    logger.info("Source code for the message stored.")
-                    
-                    # Store the text for the message
-                    data_posting.append(text)
-                    logger.info("Text for the message stored.")
-
-                except:
-                    logger.info("Something went wrong with finding the plain text message. Trying with the HTML message.")
-
-                    # Get the HTML data (if there's no plain text, there's HTML)
-                    # Pretty much the same as for the plain text. Not creating a function since it's only two. Maybe I should though...
-                    # Find the URL of the HTML message
-                    url_message = url_base + soup_posting.find('a', href = True, string = contains_html)['href']
-                    logger.info(f"URL for the HTML message obtained: {url_message}.")
-
-                    # Go to the message URL
-                    driver.get(url_message)
-                    logger.info("Web driver went to the message URL.")
-                    sleep(sleep_time)
-
-                    # Check if login is required
-                    if check_login_required(driver.page_source):
-                        logger.info("Login required. Logging in.")
-                        # Log in to the website
-                        login_cesnet(driver, password)
-                        sleep(sleep_time)
-
-                    # Get the source code for the message
-                    source_code_message = driver.page_source
-                    logger.info("Source code for the message obtained.")
-
-                    # Extract the text from the source code of the message
-                    text = extract_text(source_code_message)
-                    logger.info("Text for the message extracted.")
-
-                    # Check if there seems to be salary info
-                    salary_flag = check_salary(text)
-                    logger.info(f"salary_flag: {salary_flag}.")
-        
-                    # Store salary flag
-                    data_posting.append(salary_flag)
-                    logger.info("Salary flag appended to the list.")
-                    
-                    # Store the source code for the message
-                    data_posting.append(source_code_message)
-                    logger.info("Source code for the message stored.")
-                    
-                    # Store the text for the message
-                    data_posting.append(text)
-                    logger.info("Text for the message stored.")
-
-                # Break the loop if successful
-                logger.info("Second re-try block successful. About to break the loop.")
-                break
-
-            except Exception as e:
-                logger.info(f"Second re-try block. Attempt {attempt + 1} failed. Error: {e}")
-
-                if attempt < ntries - 1:  # Check if we have retries left
-                    logger.info("Second re-try block. Sleeping before retry.")
-                    sleep(retry_delay)
-                else:
-                    logger.info("Second re-try block. All retries exhausted.")
+# Note: if there's already a file with the same name in the folder, this code will add another with the same name
 
-                    # Store 'FAILURE' for the salary flag
-                    data_posting.append('FAILURE')
-                    
-                    # Store 'FAILURE' for the source code for the message
-                    data_posting.append('FAILURE')
+# Folder ID for the postings in Google Drive
+# https://drive.google.com/drive/u/4/folders/1qx2CMXHTj0Km3LGaD7K1dB-2jhLBya6y
+folder_id = "1qx2CMXHTj0Km3LGaD7K1dB-2jhLBya6y" 
 
-                    # Store 'FAILURE' for the text for the message
-                    data_posting.append('FAILURE')
+# Create the threads to upload the files to Google Drive in the background: first the postings, then each URL inside
+# the messages as soon as its text is extracted (see below), instead of after all the URLs
+upload_executor = ThreadPoolExecutor(max_workers=n_upload_workers)
 
-                    logger.info("Data for the posting stored as 'FAILURE'.")
+# Bound the number of uploads of the URLs inside the messages waiting in the queue, so that the pages don't pile up in it
+# when the uploads are slower
+# Note: the pages obtained with the HTTP client are all in memory at once (they are fetched concurrently), but each page is
+# released once it's uploaded, and at most n_upload_queue uploads wait in the queue (see upload_slots)
+upload_slots = threading.BoundedSemaphore(n_upload_queue)
 
-                    # Append the data for the posting to the data for the compilation
-                    data_compilation.append(data_posting)
-                    logger.info("Data for the posting appended to the data for the compilation after failure.")
+# Create list to store the futures for the uploads (to raise if an upload failed)
+upload_futures = []
 
-        # Append the data for the posting to the data for the compilation
-        data_compilation.append(data_posting)
-        logger.info("Data for the posting appended to the data for the compilation after success.")
+# Upload the source code and the text of each of the job posts (in the background, while the URLs inside the messages
+# are scraped), starting with the largest ones so that they don't end up being the last ones
+for posting_id in sorted(blobs_compilation, key=lambda posting_id: len(blobs_compilation[posting_id][0]) + len(blobs_compilation[posting_id][1]), reverse=True):
+    upload_futures.append(upload_executor.submit(upload_element, posting_id, blobs_compilation[posting_id][0], blobs_compilation[posting_id][1], folder_id, credentials))
+logger.info("Postings submitted to be uploaded to Google Drive.")
 
-# Quit the driver
-driver.quit()
-logger.info("Web driver quit.")
+# Keep only the text of each posting (to extract the URLs inside the messages)
+# The source code of the postings is now only referenced by the uploads, so each one is released once it's uploaded
+texts_postings = {posting_id: text for posting_id, (_, text) in blobs_compilation.items()}
+del blobs_compilation
 
 ##################################### Scrape the URLs inside the messages #####################################
 
 # Create list to store data for the compilation
 data_compilation_urls_inside_messages = []
 
-# Iterate over the data for the compilation
-for data_posting in data_compilation:
-    logger.info("Starting loop to get the URLs inside the messages for the compilation.")
-
-    # Get the text of the message
-    text = data_posting[-1]
-    logger.info("Text of the message obtained.")
-
-    # Extract the URLs from the text of the message
-    urls_in_message = extract_urls(text)
-    logger.info("URLs in the message extracted.")
-
-    # Iterate over the URLs found
-    for url_in_message in urls_in_message:
-        logger.info(f"Starting loop for the URLs in the message. URL: {url_in_message}.")
+# Extract the URLs once per distinct text (the same message is sometimes posted more than once)
+# Postings that couldn't be scraped have 'FAILURE' as text, so there's nothing to extract from them
+urls_by_text = {text: extract_urls(text) for text in dict.fromkeys(texts_postings.values()) if text != 'FAILURE'}
+logger.info("URLs in the messages extracted.")
 
-        # Create a list to store the data for the URL in the message
-        data_url_in_message = []
+# Create list with the posting, the timestamp, and the URL for each URL inside the messages
+urls_in_messages = []
 
-        # Store the ID for the posting
-        data_url_in_message.append(data_posting[0])
-
-        # Store the ID for the URL in the message
-        data_url_in_message.append(n_urls + len(data_compilation_urls_inside_messages) + 1)
-
-        # Store the week of the compilation
-        data_url_in_message.append(data_posting[1])
-
-        # Store the URL for the posting
-        data_url_in_message.append(data_posting[2])
-
-        # Store the URL in the message
-        data_url_in_message.append(url_in_message)
-
-        # Store the current timestamp
-        data_url_in_message.append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-        logger.info("Data for the URL in the message initialized.")
-
-        # Scrape the URL
-        source_code_url_in_message = get_selenium_response(url_in_message)
-        logger.info(f"Source code for the URL in the message obtained.")
+# Iterate over the data for the compilation
+for data_posting in data_compilation:
 
-        # Extract the text from the response
-        text_in_url_in_message = extract_text(source_code_url_in_message)
-        logger.info(f"Text extracted from the URL in the message.")
+    # Get the current timestamp (the same for all the URLs in the message)
+    ts_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        # Check if there seems to be salary info
-        salary_flag = check_salary(text_in_url_in_message)
-        logger.info(f"salary_flag: {salary_flag}.")
+    # Store each of the URLs in the message
+    for url_in_message in urls_by_text.get(texts_postings[data_posting[0]], []):
+        urls_in_messages.append((data_posting, ts_now, url_in_message))
+logger.info(f"Number of URLs inside the messages: {len(urls_in_messages)}.")
 
-        # Store salary flag
-        data_url_in_message.append(salary_flag)
-        logger.info("Salary flag appended to the list.")
-        
-        # Store the source code for the URL in the message
-        data_url_in_message.append(source_code_url_in_message)
-        logger.info(f"Source code for the URL in the message stored.")
-        
-        # Store the text for the URL in the message
-        data_url_in_message.append(text_in_url_in_message)
-        logger.info(f"Text for the URL in the message stored.")
+# Get the IDs for the URLs inside the messages of each unique URL (one ID per message with the URL)
+ids_by_url = {}
+for i, (_, _, url_in_message) in enumerate(urls_in_messages):
+    ids_by_url.setdefault(url_in_message, []).append(n_urls + i + 1)
 
-        # Append the data for the URL in the message to the data for the compilation
-        data_compilation_urls_inside_messages.append(data_url_in_message)
-        logger.info("Data for the URL in the message appended to the data for the compilation.")
+# Folder ID for the URLs inside the messages in Google Drive
+# https://drive.google.com/drive/u/4/folders/1du_dluC7hiGmk4EuQHCCH8Y0Rw9zxsmg
+folder_urls_id = "1du_dluC7hiGmk4EuQHCCH8Y0Rw9zxsmg"
+
+# Get the unique URLs inside the messages (the same URL can be in several messages, e.g., a job board)
+unique_urls_in_messages = list(dict.fromkeys(url_in_message for _, _, url_in_message in urls_in_messages))
+logger.info(f"Number of unique URLs inside the messages: {len(unique_urls_in_messages)}.")
+
+# Scrape the unique URLs inside the messages concurrently with an HTTP client (or get them from the local cache)
+pages_urls_in_messages = asyncio.run(fetch_urls(unique_urls_in_messages))
+logger.info("Source code for the URLs inside the messages obtained with the HTTP client.")
+
+# Create dictionary to store the salary flag for each unique URL
+salary_flags_urls_in_messages = {}
+
+# Scrape the URLs that the HTTP client couldn't get with several browsers at the same time (each thread has its own browser)
+browser_executor = ThreadPoolExecutor(n_browsers)
+pages_urls_in_messages = [
+    browser_executor.submit(lambda url: {'source_code': get_selenium_response(get_browser(), url)}, url_in_message) if page_url_in_message is None else page_url_in_message
+    for url_in_message, page_url_in_message in zip(unique_urls_in_messages, pages_urls_in_messages)
+]
+browser_executor.shutdown(wait=False)
+logger.info("URLs inside the messages that need JavaScript submitted to the browsers.")
+
+# Create queue to store the URL, the data for the page, and the text and the salary flag (or the future for them) for each unique URL
+# (a queue, so that each page is dropped as soon as it's handed off to the uploads)
+pages_to_process = deque()
+
+# Iterate over the unique URLs inside the messages
+for url_in_message, page_url_in_message in zip(unique_urls_in_messages, pages_urls_in_messages):
+    logger.debug("Starting loop for the unique URLs in the messages. URL: %s.", url_in_message)
+
+    # If the HTTP client couldn't get the URL, wait for the browser that is scraping it
+    if not isinstance(page_url_in_message, dict):
+        page_url_in_message = page_url_in_message.result()
+        logger.debug("Source code for the URL in the message obtained with Selenium.")
+
+    # If the page comes from the cache (or was skipped, see fetch_url), the text and the salary flag are already there
+    if 'text' in page_url_in_message:
+        pages_to_process.append((url_in_message, page_url_in_message, (page_url_in_message['text'], page_url_in_message['salary_flag'])))
+        logger.debug("Text and salary_flag obtained from the cache.")
+    else:
+        # Extract the text and check if there seems to be salary info in another process
+        pages_to_process.append((url_in_message, page_url_in_message, extraction_executor.submit(extract_and_flag, page_url_in_message['source_code'])))
+        logger.debug("Text extraction and salary check submitted.")
+
+# Drop the list of pages (they are now only referenced by pages_to_process)
+del pages_urls_in_messages
+n_unique_urls_in_messages = len(pages_to_process)
+
+# Index of the next URL inside the messages to store (the unique URLs are in the order of their first message, so the rows
+# of the URLs inside the messages are ready in order as the unique URLs are processed)
+next_url_in_message = 0
+
+# Create the thread to append the data for the URLs inside the messages to Google Sheets while the rest of the pages are
+# processed (only one, so that the chunks are appended in order)
+append_executor = ThreadPoolExecutor(max_workers=1)
+
+# Create list to store the futures for the chunks appended to Google Sheets (to raise if a chunk failed)
+append_futures = []
+
+# Iterate over the unique URLs inside the messages (in the same order), taking each one out of the queue
+for i in range(1, n_unique_urls_in_messages + 1):
+    url_in_message, page_url_in_message, text_and_flag = pages_to_process.popleft()
+    source_code_url_in_message = page_url_in_message['source_code']
+
+    # Get the text and the salary flag (waiting for the extraction if needed) and cache them
+    if 'text' in page_url_in_message:
+        text_in_url_in_message, salary_flag = text_and_flag
+    else:
+        text_in_url_in_message, salary_flag = text_and_flag.result()
+        logger.debug("Text extracted from the URL in the message. salary_flag: %s.", salary_flag)
+        if source_code_url_in_message: # Don't cache pages that couldn't be scraped
+            # Best effort: if the cache fails, the page is still stored and uploaded
+            try:
+                write_cache(url_in_message, source_code_url_in_message, text_in_url_in_message, salary_flag, page_url_in_message.get('etag'), page_url_in_message.get('last_modified'))
+            except Exception as e:
+                logger.info(f"Couldn't cache the data for the URL in the message. URL: {url_in_message}. Error: {e}")
+
+    # Store the salary flag for the URL
+    salary_flags_urls_in_messages[url_in_message] = salary_flag
+
+    # Store the data for the URLs inside the messages whose salary flag is now known (in order, see next_url_in_message)
+    while next_url_in_message < len(urls_in_messages) and urls_in_messages[next_url_in_message][2] in salary_flags_urls_in_messages:
+        data_posting, ts_now, url_in_message_row = urls_in_messages[next_url_in_message]
+
+        # Store the ID for the posting, the ID for the URL in the message (see ids_by_url), the week of the compilation,
+        # the URL for the posting, the URL in the message, the current timestamp, and the salary flag for the URL in the message
+        # (the source code and the text are already being uploaded to Google Drive)
+        data_compilation_urls_inside_messages.append([
+            data_posting[0],
+            n_urls + next_url_in_message + 1,
+            data_posting[1],
+            data_posting[2],
+            url_in_message_row,
+            ts_now,
+            salary_flags_urls_in_messages[url_in_message_row]
+            ])
+        next_url_in_message += 1
+
+    # Append the data for the URLs inside the messages to Google Sheets in chunks (in the background)
+    if len(data_compilation_urls_inside_messages) >= n_rows_chunk:
+        append_futures.append(append_executor.submit(append_rows_after, append_futures[-1] if append_futures else None, spreadsheet_urls_id, 'A:G', data_compilation_urls_inside_messages, credentials))
+        data_compilation_urls_inside_messages = []
+        logger.info("Chunk of data for the URLs inside the messages submitted to Google Sheets.")
+
+    # Upload the source code and the text for each message with the URL to Google Drive (in the background)
+    # (waiting for a free slot in the queue if there are too many uploads waiting)
+    for url_id in ids_by_url[url_in_message]:
+        upload_slots.acquire()
+        upload_future = upload_executor.submit(upload_element, url_id, source_code_url_in_message, text_in_url_in_message, folder_urls_id, credentials)
+        upload_future.add_done_callback(lambda _: upload_slots.release())
+        upload_futures.append(upload_future)
+
+    # Log the progress every n_log_progress URLs (instead of logging each step for each URL)
+    if i % n_log_progress == 0 or i == n_unique_urls_in_messages:
+        logger.info(f"Processed {i}/{n_unique_urls_in_messages} unique URLs inside the messages.")
+
+# Close the processes for the text extraction
+extraction_executor.shutdown()
+logger.info("Text extracted and salary info checked for all the unique URLs inside the messages.")
+
+# Append the rest of the data for the URLs inside the messages and wait for all the chunks
+if data_compilation_urls_inside_messages:
+    append_futures.append(append_executor.submit(append_rows_after, append_futures[-1] if append_futures else None, spreadsheet_urls_id, 'A:G', data_compilation_urls_inside_messages, credentials))
+append_executor.shutdown(wait=True)
+
+# Raise if a chunk couldn't be appended (the job fails instead of silently losing rows)
+for append_future in append_futures:
+    append_future.result()
+logger.info("Wrote new data to Google Sheets for the URLs inside the messages (if available)")
 
 logger.info("Scraping finished.")
 
 ####################################### WRITE NEW DATA TO GOOGLE SHEETS #######################################
 
-# Data for the postings
-
-# Retry block in case of failure
-for attempt in range(ntries):
-
-    try:
-        logger.info(f"Re-try block for data for postings (Google Sheets). Attempt {attempt + 1}.")
-
-        # Range to write the data
-        range_sheet="A"+str(n_compilations+1)+":E10000000"
-        logger.info("Prepared range to write the data for the postings")
-
-        # Body of the request
-        # The last two elements of each element in data are the source code and the text, which are not written to the Google Sheet
-        body={"values": [element[:-2] for element in data_compilation]}
-        logger.info("Prepared body of the request for the postings")
-
-        # Execute the request
-        result = service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_postings_id,
-            range=range_sheet,
-            valueInputOption="USER_ENTERED",
-            body=body
-            ).execute()
-        logger.info("Wrote new data to Google Sheets for the postings")
-
-        # Break the loop if successful
-        logger.info("Re-try block for data for postings successful. About to break the loop.")
-        break
-    
-    except Exception as e:
-        logger.info(f"Re-try block for data for postings. Attempt {attempt + 1} failed. Error: {e}")
-
-        if attempt < ntries - 1:
-            logger.info("Re-try block for data for postings. Sleeping before retry.")
-            sleep(retry_delay)
-        else:
-            logger.info("Re-try block for data for postings. All retries exhausted.")
-            raise
-
-# Data for the URLs inside the messages
+# Data for the postings: appended at the end of the script (see below)
 
-# Retry block in case of failure
-for attempt in range(ntries):
-
-    try:
-        logger.info(f"Re-try block for data for URLs inside the messages (Google Sheets). Attempt {attempt + 1}.")
-
-        # Range to write the data
-        range_sheet="A"+str(n_urls+1)+":G10000000"
-        logger.info("Prepared range to write the data for the URLs inside the messages")
-
-        # Body of the request
-        # The last two elements of each element in data are the source code and the text, which are not written to the Google Sheet
-        body={"values": [element[:-2] for element in data_compilation_urls_inside_messages]}
-        logger.info("Prepared body of the request for the URLs inside the messages")
-
-        # Execute the request
-        result = service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_urls_id,
-            range=range_sheet,
-            valueInputOption="USER_ENTERED",
-            body=body
-            ).execute()
-        logger.info("Wrote new data to Google Sheets for the URLs inside the messages")
-
-        # Break the loop if successful
-        logger.info("Re-try block for data for URLs inside the messages successful. About to break the loop.")
-        break
-    
-    except Exception as e:
-        logger.info(f"Re-try block for data for URLs inside the messages. Attempt {attempt + 1} failed. Error: {e}")
-
-        if attempt < ntries - 1:
-            logger.info("Re-try block for data for URLs inside the messages. Sleeping before retry.")
-            sleep(retry_delay)
-        else:
-            logger.info("Re-try block for data for URLs inside the messages. All retries exhausted.")
-            raise
+# Data for the URLs inside the messages: already appended in chunks while scraping (see above)
 
 ####################################### WRITE NEW DATA TO GOOGLE DRIVE #######################################
 
-# Note: if there's already a file with the same name in the folder, this code will add another with the same name
+# Data for the postings and the URLs inside the messages: uploaded while scraping, wait for the uploads to finish
+upload_executor.shutdown(wait=True)
 
-# Data for the postings
+# Raise if a file couldn't be uploaded (or something went wrong outside the retry block of upload_file), so that the
+# postings aren't appended to Google Sheets
+for upload_future in upload_futures:
+    upload_future.result()
+logger.info("Wrote new data for the postings and the URLs inside the messages (if available) to Google Drive.")
 
-# Folder ID
-# https://drive.google.com/drive/u/4/folders/1qx2CMXHTj0Km3LGaD7K1dB-2jhLBya6y
-folder_id = "1qx2CMXHTj0Km3LGaD7K1dB-2jhLBya6y" 
-
-# Retry block in case of failure
-for attempt in range(ntries):
-
-    try:
-        logger.info(f"Re-try block for data for the postings (Google Drive). Attempt {attempt + 1}.")
-
-        # Authenticate using the service account (for Google Drive, not Sheets)
-        service = build('drive', 'v3', credentials=credentials)
-        logger.info("Created service for Google Drive")
-                    
-        # Iterate over each of the job posts (list)
-        for element in data_compilation:
-            logger.info("Iterating over each of the postings")
-            # Get the source code of the job post
-            source_code = element[-2]
-            logger.info("Got the source code of the post")
-            # Get the text of the job post
-            text = element[-1]
-            logger.info("Got the text of the post")
-            # Upload the source code to Google Drive
-            upload_file(element[0], "source_code", source_code, folder_id, service, logger)
-            # Upload the text to Google Drive
-            upload_file(element[0], "text", text, folder_id, service, logger)
-        logger.info("Wrote new data for the postings (if available) to Google Drive.")
-
-        # Break the loop if successful
-        logger.info("Re-try block for data for the postings successful. About to break the loop.")
-        break
-
-    except Exception as e:
-        logger.info(f"Re-try block for data for the postings. Attempt {attempt + 1} failed. Error: {e}")
-
-        if attempt < ntries - 1:
-            logger.info("Re-try block for data for the postings. Sleeping before retry.")
-            sleep(retry_delay)
-        else:
-            logger.info("Re-try block for data for the postings. All retries exhausted.")
-            raise
-
-# Data for the URLs inside the messages
+####################################### WRITE THE POSTINGS TO GOOGLE SHEETS #######################################
 
-# Folder ID
-# https://drive.google.com/drive/u/4/folders/1du_dluC7hiGmk4EuQHCCH8Y0Rw9zxsmg
-folder_id = "1du_dluC7hiGmk4EuQHCCH8Y0Rw9zxsmg"
-
-# Retry block in case of failure
-for attempt in range(ntries):
-
-    try:
-        logger.info(f"Re-try block for data for the URLs inside the messages (Google Drive). Attempt {attempt + 1}.")
-
-        # Iterate over each of the URLs inside the messages (list)
-        for element in data_compilation_urls_inside_messages:
-            logger.info("Iterating over each of the URLs inside the messages")
-            # Get the source code of the URL inside the message
-            source_code = element[-2]
-            logger.info("Got the source code of the URL inside the message")
-            # Get the text of the URL inside the message
-            text = element[-1]
-            logger.info("Got the text of the URL inside the message")
-            # Upload the source code to Google Drive
-            upload_file(element[1], "source_code", source_code, folder_id, service, logger)
-            # Upload the text to Google Drive
-            upload_file(element[1], "text", text, folder_id, service, logger)
-        logger.info("Wrote new data for the URLs inside the messages (if available) to Google Drive.")
-
-        # Break the loop if successful
-        logger.info("Re-try block for data for the URLs inside the messages successful. About to break the loop.")
-        break
-
-    except Exception as e:
-        logger.info(f"Re-try block for data for the URLs inside the messages. Attempt {attempt + 1} failed. Error: {e}")
-
-        if attempt < ntries - 1:
-            logger.info("Re-try block for data for the URLs inside the messages. Sleeping before retry.")
-            sleep(retry_delay)
-        else:
-            logger.info("Re-try block for data for the URLs inside the messages. All retries exhausted.")
-            raise
+# The postings are written last because the Google Sheet with the postings decides which compilations are collected:
+# if something fails before this point, the next run scrapes the same compilations again (the postings come from the
+# local cache and get the same IDs, so their files in Google Drive are uploaded again with the same names)
+# Note: in that case, the URLs inside the messages already appended to their Google Sheet are appended again (with new IDs)
+if data_compilation:
+    append_rows(spreadsheet_postings_id, 'A:E', data_compilation, credentials)
+logger.info("Wrote new data to Google Sheets for the postings (if available)")
 
 logger.info("Script finished successfully.")